@@ -5,13 +5,15 @@ import subprocess
 import shlex
 import uuid
 
-def download_with_ytdlp(url, filename_prefix="clip"):
+def download_with_ytdlp(url, filename_prefix="clip", concurrent_fragments=5):
     """
     Use yt-dlp to robustly download video (supports reddit, youtube, tiktok, twitter links).
+    Fragmented (DASH/HLS) sources download several fragments at once.
     Returns path to downloaded file.
     """
     outname = os.path.join(DOWNLOAD_DIR, f"{filename_prefix}_{uuid.uuid4().hex}.%(ext)s")
-    cmd = f"yt-dlp -f best -o {shlex.quote(outname)} {shlex.quote(url)}"
+    cmd = (f"yt-dlp -f best --concurrent-fragments {int(concurrent_fragments)} "
+           f"-o {shlex.quote(outname)} {shlex.quote(url)}")
     print("Running:", cmd)
     subprocess.check_call(cmd, shell=True)
     # find the file created (yt-dlp expands extension)
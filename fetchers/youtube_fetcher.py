@@ -3,23 +3,43 @@ import os
 import re
 import json
 import random
+import shelve
 from googleapiclient.discovery import build
 from datetime import datetime, timedelta, timezone
 
 # === CONFIG ===
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 SEEN_VIDEOS_FILE = "data/seen_videos.json"  # store previously used videos
+DETAILS_CACHE_FILE = "data/yt_details.db"  # videoId -> details, saves quota on re-runs
+
+# Compiled once at import instead of per call
+_ISO_MATCH = re.compile(r"PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?").fullmatch
 
 # === HELPERS ===
 def parse_iso_duration(duration_str):
     """Convert ISO 8601 duration (e.g., PT45S, PT1M2S) to seconds."""
-    match = re.match(r"PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?", duration_str)
-    if not match:
+    m = _ISO_MATCH(duration_str)
+    if not m:
         return 0
-    hours = int(match.group(1)) if match.group(1) else 0
-    minutes = int(match.group(2)) if match.group(2) else 0
-    seconds = int(match.group(3)) if match.group(3) else 0
-    return hours * 3600 + minutes * 60 + seconds
+    return 3600 * int(m[1] or 0) + 60 * int(m[2] or 0) + int(m[3] or 0)
+
+
+def _load_video_details(youtube, video_ids):
+    """
+    Return full video details for the given IDs, only hitting the API
+    for IDs not already in the on-disk cache.
+    """
+    os.makedirs(os.path.dirname(DETAILS_CACHE_FILE), exist_ok=True)
+    with shelve.open(DETAILS_CACHE_FILE) as cache:
+        missing = [vid for vid in video_ids if vid not in cache]
+        if missing:
+            video_req = youtube.videos().list(
+                part="snippet,contentDetails,statistics",
+                id=",".join(missing)
+            )
+            for item in video_req.execute().get("items", []):
+                cache[item["id"]] = item
+        return [cache[vid] for vid in video_ids if vid in cache]
 
 
 def load_seen_videos():
@@ -81,22 +101,22 @@ def search_youtube_short_videos(
         order="viewCount",
     )
     search_res = search_req.execute()
-    video_ids = [item["id"]["videoId"] for item in search_res.get("items", [])]
+    # Dedupe before details/selection: duplicate videoIds in the search
+    # response would otherwise eat max_clips slots in the greedy pick
+    video_ids = list(dict.fromkeys(
+        item["id"]["videoId"] for item in search_res.get("items", [])
+    ))
 
     if not video_ids:
         print("⚠️ No search results found.")
         return []
 
-    # 2️⃣ Get full video details (duration, stats)
-    video_req = youtube.videos().list(
-        part="snippet,contentDetails,statistics",
-        id=",".join(video_ids)
-    )
-    video_res = video_req.execute()
+    # 2️⃣ Get full video details (duration, stats), cached by videoId
+    video_details = _load_video_details(youtube, video_ids)
 
     # 3️⃣ Filter and format results
     items = []
-    for vid in video_res.get("items", []):
+    for vid in video_details:
         video_id = vid["id"]
 
         # skip already used
@@ -135,15 +155,30 @@ def search_youtube_short_videos(
         print("⚠️ No videos passed filters.")
         return []
 
-    # 4️⃣ Pick up to max_clips
-    random.shuffle(items)
-    chosen = items[:max_clips]
+    # 4️⃣ Greedy single-pass pack: keep a running total instead of
+    # re-summing candidate sets, stop at the clip/duration limits.
+    # Visit order comes from sampling an index range — no in-place
+    # shuffle of the list and no copy of it either.
+    chosen = []
+    total_duration = 0
+    for idx in random.sample(range(len(items)), len(items)):
+        v = items[idx]
+        if len(chosen) >= max_clips:
+            break
+        if total_duration + v["duration"] > max_total_duration:
+            continue
+        chosen.append(v)
+        total_duration += v["duration"]
+
+    if not chosen:
+        print("⚠️ No combination of videos fit the duration budget.")
+        return []
 
     # 5️⃣ Remember used video IDs
     used = seen_videos.union({v["videoId"] for v in chosen})
     save_seen_videos(used)
 
-    print(f"✅ Selected {len(chosen)} RDR2 YouTube clips totaling {sum(v['duration'] for v in chosen)}s")
+    print(f"✅ Selected {len(chosen)} RDR2 YouTube clips totaling {total_duration}s")
     print(f"✅ All videos have ≥ {min_likes} likes and are at least 60 days old.")
     print(f"🧠 Remembered {len(used)} total seen videos.")
     return chosen
@@ -0,0 +1,16 @@
+# labels.py
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def simple_label_from_title(title, index):
+    """
+    Cheap deterministic fallback label derived from the clip title, for
+    when AI label generation comes up short. partition() grabs the head
+    without splitting the whole string, and duplicate titles hit the
+    lru_cache.
+    """
+    head = title.partition(" - ")[0]
+    if len(head) > 20:
+        head = head[:20] + "..."
+    return f"{index + 1}. {head.upper()}"
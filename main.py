@@ -1,15 +1,143 @@
 # main.py
+import os
+import sys
+import json
+import queue
 import random
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import redis
+from config import CACHE_DIR, OUTPUT_DIR
 from fetchers.youtube_fetcher import search_youtube_short_videos
 from downloaders.downloader import download_with_ytdlp
-from editor import compose_short
+from editor import compose_short, plan_clip_durations, preprocess_clip
 from uploader import upload_video
 
 
+# Candidate fetches are identical across back-to-back runs but count
+# against YouTube API quota, so they are cached in Redis for a short TTL
+FETCH_CACHE_TTL = 3600  # seconds
+
+# Tags are the same every run; build them once instead of a fresh list
+# literal per upload
+DEFAULT_TAGS = ("shorts", "funny", "viral", "compilation", "trending")
+
+
+def cached_fetch(key, ttl, fn, *args, **kwargs):
+    """
+    Return fn(*args, **kwargs), served from Redis when a warm entry for
+    `key` exists. Falls through to a direct call when Redis is absent.
+    """
+    client = None
+    try:
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+        )
+        cached = client.get(key)
+        if cached is not None:
+            print(f"♻️  Using cached fetch results for {key}")
+            return json.loads(cached)
+    except Exception:
+        client = None
+
+    result = fn(*args, **kwargs)
+
+    # Don't cache empty results: a transient API/quota failure would
+    # otherwise pin "no results" for the whole TTL
+    if client is not None and result:
+        try:
+            client.setex(key, ttl, json.dumps(result))
+        except Exception:
+            pass
+    return result
+
+
+def _fetch(i, vid, total):
+    """Download one clip; returns (i, path) with path=None on failure."""
+    try:
+        print(f"⬇️  Downloading clip {i + 1}/{total}: {vid['title']}")
+        path = download_with_ytdlp(vid["url"], filename_prefix=f"clip{i}")
+        return i, path
+    except Exception as e:
+        print(f"⚠️  Failed to download {vid.get('url')}: {e}")
+        return i, None
+
+
+def _download_and_compose(yt_videos):
+    """Download the picked clips and compose the short; returns (path, title)."""
+    # Trim targets come from the fetcher metadata, so preprocessing can
+    # start before every download has finished
+    targets = plan_clip_durations([v["duration"] for v in yt_videos])
+
+    # 2️⃣ Download the clips in parallel and pipeline them into the
+    # CPU-bound vertical-segment preprocessing as they arrive
+    work_queue = queue.Queue()
+    preprocessed = []
+
+    def _preprocess_worker():
+        while True:
+            item = work_queue.get()
+            if item is None:
+                break
+            i, path = item
+            segment_path = os.path.join(OUTPUT_DIR, f"segment_{i}.mp4")
+            try:
+                preprocessed.append((i, targets[i], preprocess_clip(path, targets[i], segment_path)))
+            except Exception as e:
+                print(f"⚠️  Failed to preprocess clip {i + 1}: {e}")
+
+    preprocessor = threading.Thread(target=_preprocess_worker, daemon=True)
+    preprocessor.start()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(8, len(yt_videos))) as ex:
+        futures = [ex.submit(_fetch, i, vid, len(yt_videos)) for i, vid in enumerate(yt_videos)]
+        for future in as_completed(futures):
+            i, path = future.result()
+            results.append((i, path))
+            if path and targets[i] > 0:
+                work_queue.put((i, path))
+
+    work_queue.put(None)
+    preprocessor.join()
+
+    results.sort(key=lambda r: r[0])
+    downloaded = [(i, path) for i, path in results if path]
+
+    if not downloaded:
+        print("❌ No clips were successfully downloaded.")
+        return None, None
+
+    # 3️⃣ Compose the pre-rendered segments into one vertical short
+    # (labels auto-generated in editor.py)
+    print("🎬 Editing and compiling video...")
+    index_map = {}
+    clip_data = []
+    for new_i, (i, path) in enumerate(downloaded):
+        index_map[i] = new_i
+        clip_data.append({"path": path, "title": yt_videos[i]["title"]})
+    segments = [(index_map[i], duration, segment_path)
+                for i, duration, segment_path in preprocessed if i in index_map]
+
+    result = compose_short(clip_data, output_filename="final_short.mp4",
+                           segments=segments or None)
+    print(f"✅ Final short created at: {result['path']}")
+
+    # 4️⃣ Use the funny title generated by editor.py
+    return result["path"], result["title"] or "Funny Compilation Shorts 😂"
+
+
 def main():
     print("🔍 Searching YouTube for trending funny/viral shorts...")
     # Fetch curated videos from YouTube only
-    yt_videos = search_youtube_short_videos(
+    yt_videos = cached_fetch(
+        "fetch:youtube:rdr2|reddeadredemption2|rdro:50",
+        FETCH_CACHE_TTL,
+        search_youtube_short_videos,
         tags=("rdr2", "reddeadredemption2", "rdro"),
         max_results=50,
         max_total_duration=61,
@@ -22,32 +150,35 @@ def main():
         return
 
     print(f"✅ Found {len(yt_videos)} clips within duration limit.")
-    for i, v in enumerate(yt_videos, start=1):
-        print(f"   {i}. {v['title']} ({v['duration']}s)")
+    # One write for the whole listing: a print per clip grabs the
+    # stdout lock and flushes each line when piped to a file
+    sys.stdout.write("\n".join(
+        f"   {i}. {v['title']} ({v['duration']}s)"
+        for i, v in enumerate(yt_videos, start=1)
+    ) + "\n")
 
-    # 2️⃣ Download the selected clips
-    downloaded_paths = []
-    for i, vid in enumerate(yt_videos):
-        try:
-            print(f"⬇️  Downloading clip {i + 1}/{len(yt_videos)}: {vid['title']}")
-            path = download_with_ytdlp(vid["url"], filename_prefix=f"clip{i}")
-            downloaded_paths.append(path)
-        except Exception as e:
-            print(f"⚠️  Failed to download {vid.get('url')}: {e}")
+    # Fingerprint the picked clip set: if an identical set was already
+    # composed, reuse that video and skip download + compose entirely
+    fingerprint = hashlib.blake2b(
+        "|".join(sorted(v["url"] for v in yt_videos)).encode()
+    ).hexdigest()[:16]
+    cached_video = os.path.join(CACHE_DIR, f"{fingerprint}.mp4")
+    cached_meta = os.path.join(CACHE_DIR, f"{fingerprint}.json")
 
-    if not downloaded_paths:
-        print("❌ No clips were successfully downloaded.")
-        return
-
-    # 3️⃣ Compose into one vertical short (labels now auto-generated in editor.py)
-    print("🎬 Editing and compiling video...")
-    output_path = compose_short(downloaded_paths, output_filename="final_short.mp4")
-    print(f"✅ Final short created at: {output_path}")
+    if os.path.exists(cached_video) and os.path.exists(cached_meta):
+        print("♻️  Re-using cached composition for this clip set.")
+        output_path = os.path.join(OUTPUT_DIR, "final_short.mp4")
+        shutil.copy(cached_video, output_path)
+        with open(cached_meta, "r") as f:
+            title = json.load(f).get("title") or "Funny Compilation Shorts 😂"
+    else:
+        output_path, title = _download_and_compose(yt_videos)
+        if output_path is None:
+            return
+        shutil.copy(output_path, cached_video)
+        with open(cached_meta, "w") as f:
+            json.dump({"title": title}, f)
 
-    # 4️⃣ Use the funny title generated by editor.py
-    title = getattr(output_path, "ai_generated_title", None)
-    if not title:
-        title = "Funny Compilation Shorts 😂"
     print(f"📝 Using AI-generated title: {title}")
 
     # 5️⃣ Upload to YouTube
@@ -58,7 +189,7 @@ def main():
             file_path=output_path,
             title=title,
             description="Compilation of trending funny and viral shorts automatically created by the bot.",
-            tags=["shorts", "funny", "viral", "compilation", "trending"],
+            tags=list(DEFAULT_TAGS),
             privacy="public"
         )
         print("✅ Upload completed successfully!")
@@ -1,37 +1,101 @@
 # uploader.py
+import io
 import os
-import pickle
+import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+import urllib3
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload
+from google.auth.transport.urllib3 import Request as Urllib3Request
+from google.oauth2.credentials import Credentials
+from google.oauth2 import service_account
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 from config import YOUTUBE_CLIENT_SECRETS_FILE
 
 # --- Scopes & Token Path ---
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
-TOKEN_PATH = os.path.join("config", "youtube_token.pickle")
+TOKEN_PATH = os.path.join("config", "youtube_token.json")
+
+# Built service reused across upload_video calls (token I/O + discovery
+# setup are not free); guarded for concurrent uploaders
+_service = None
+_service_creds = None
+_service_lock = threading.Lock()
+
+# One connection pool for every token refresh, so repeated refreshes
+# reuse an established TLS connection instead of handshaking each time
+_refresh_pool = urllib3.PoolManager()
+
+# Shared transport for API calls: keeps the TLS connection alive across
+# retries and batch uploads, with an on-disk cache for HTTP-cacheable
+# responses
+_http = httplib2.Http(cache=".httpcache", timeout=60)
+
+
+def _authorized_build(creds):
+    return build(
+        "youtube", "v3",
+        http=AuthorizedHttp(creds, http=_http),
+        cache_discovery=False,
+    )
+
+
+def _warm_discovery():
+    """Pre-build a throwaway client so the discovery document and its
+    lazy imports are warm before the real upload-time build()."""
+    try:
+        build("youtube", "v3", developerKey=None)
+    except Exception:
+        pass
+
+
+# Runs in the background during download/compose; the build() on the
+# upload path then finds everything already parsed and cached
+threading.Thread(target=_warm_discovery, daemon=True).start()
 
 def get_authenticated_service():
     """
     Handles OAuth 2.0 authorization.
+    - Reuses the already-built service while its credentials are valid.
     - Loads saved credentials if available.
     - Refreshes expired tokens automatically.
     - Prompts for login only the first time.
     """
+    global _service, _service_creds
+
+    with _service_lock:
+        if _service is not None and _service_creds is not None and _service_creds.valid:
+            return _service
+        _service, _service_creds = _build_service()
+        return _service
+
+
+def _build_service():
+    # Server/CI runs: a service-account key bypasses the interactive
+    # OAuth flow and the token-file round trip entirely
+    sa_path = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
+    if sa_path:
+        creds = service_account.Credentials.from_service_account_file(
+            sa_path, scopes=SCOPES
+        )
+        return _authorized_build(creds), creds
+
     creds = None
 
-    # Load existing token if it exists
+    # Load existing token if it exists (plain JSON, no pickle)
     if os.path.exists(TOKEN_PATH):
-        with open(TOKEN_PATH, "rb") as token_file:
-            creds = pickle.load(token_file)
+        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
 
     # Refresh or initiate OAuth flow if necessary
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             print("🔄 Refreshing YouTube credentials...")
-            creds.refresh(Request())
+            creds.refresh(Urllib3Request(_refresh_pool))
         else:
             print("🔐 No valid credentials found. Please authorize access.")
             flow = InstalledAppFlow.from_client_secrets_file(
@@ -40,13 +104,88 @@ def get_authenticated_service():
             creds = flow.run_local_server(port=0)
         # Save the new credentials for future use
         os.makedirs(os.path.dirname(TOKEN_PATH), exist_ok=True)
-        with open(TOKEN_PATH, "wb") as token_file:
-            pickle.dump(creds, token_file)
+        with open(TOKEN_PATH, "w") as token_file:
+            token_file.write(creds.to_json())
+
+    return _authorized_build(creds), creds
+
 
-    return build("youtube", "v3", credentials=creds)
+class _ReadaheadFile(io.RawIOBase):
+    """
+    Read-only file wrapper that prefetches the next upload chunk on a
+    background thread, so disk reads overlap with the in-flight HTTPS
+    writes instead of blocking the upload loop between chunks.
+    """
+
+    def __init__(self, path, chunksize):
+        super().__init__()
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._chunksize = chunksize if chunksize > 0 else self._size
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        # seek()+read() on the shared fd must not interleave between
+        # the upload thread and an in-flight prefetch
+        self._file_lock = threading.Lock()
+        self._pos = 0
+        self._pending = None  # (offset, future)
+        self._prefetch(0)
 
+    def _read_at(self, offset, size):
+        with self._file_lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def _prefetch(self, offset):
+        if offset < self._size:
+            self._pending = (offset, self._pool.submit(self._read_at, offset, self._chunksize))
+        else:
+            self._pending = None
 
-def upload_video(file_path, title, description="", tags=None, privacy="public"):
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = pos
+        elif whence == io.SEEK_CUR:
+            self._pos += pos
+        else:
+            self._pos = self._size + pos
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size - self._pos
+        if self._pending is not None and self._pending[0] == self._pos:
+            buffered = self._pending[1].result()
+        else:
+            # Out-of-order read (e.g. after a retry rewind) — go to disk
+            buffered = self._read_at(self._pos, size)
+        data = buffered[:size]
+        if len(data) < size:
+            data += self._read_at(self._pos + len(data), size - len(data))
+        self._pos += len(data)
+        self._prefetch(self._pos)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        # Let an in-flight prefetch finish before yanking the fd out
+        # from under it
+        self._pool.shutdown(wait=True)
+        self._file.close()
+        super().close()
+
+
+def upload_video(file_path, title, description="", tags=None, privacy="public",
+                 chunksize=100 * 1024 * 1024):
     """
     Uploads a video file to YouTube using the authorized credentials.
 
@@ -56,12 +195,19 @@ def upload_video(file_path, title, description="", tags=None, privacy="public"):
         description (str): Video description.
         tags (list[str]): List of tags.
         privacy (str): 'public', 'private', or 'unlisted'.
+        chunksize (int): Resumable-upload chunk size in bytes; rounded
+            down to the 256 KiB multiple YouTube requires. Pass -1 to
+            send the whole file in one request.
 
     Returns:
         dict: The YouTube API response (video metadata).
     """
     youtube = get_authenticated_service()
 
+    if chunksize != -1:
+        # YouTube requires chunk sizes in multiples of 256 KiB
+        chunksize = max(256 * 1024, (chunksize // (256 * 1024)) * (256 * 1024))
+
     body = {
         "snippet": {
             "title": title,
@@ -74,7 +220,17 @@ def upload_video(file_path, title, description="", tags=None, privacy="public"):
         }
     }
 
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
+    stream = None
+    if chunksize == -1:
+        media = MediaFileUpload(file_path, chunksize=chunksize, resumable=True)
+    else:
+        stream = _ReadaheadFile(file_path, chunksize)
+        media = MediaIoBaseUpload(
+            stream,
+            mimetype="video/mp4",
+            chunksize=chunksize,
+            resumable=True,
+        )
 
     try:
         print(f"🚀 Starting upload: {title}")
@@ -85,8 +241,28 @@ def upload_video(file_path, title, description="", tags=None, privacy="public"):
         )
 
         response = None
+        backoff = 1
+        retries = 0
         while response is None:
-            status, response = request.next_chunk()
+            try:
+                status, response = request.next_chunk()
+            except (HttpError, socket.error) as e:
+                # Transient server/socket errors: back off and resume
+                # from the last acknowledged chunk instead of restarting
+                # the whole upload. Persistent failures re-raise into
+                # the outer handlers rather than looping forever.
+                if isinstance(e, HttpError) and e.resp.status not in (500, 502, 503, 504):
+                    raise
+                retries += 1
+                if retries > 10:
+                    print("❌ Too many transient upload errors; giving up.")
+                    raise
+                print(f"🔁 Transient upload error ({e}); retrying in {backoff}s...")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 64)
+                continue
+            backoff = 1
+            retries = 0
             if status:
                 print(f"⬆️ Upload progress: {int(status.progress() * 100)}%")
             time.sleep(0.2)
@@ -100,11 +276,18 @@ def upload_video(file_path, title, description="", tags=None, privacy="public"):
         print(f"❌ HTTP Error during upload: {e}")
         if e.resp.status in [500, 502, 503, 504]:
             print("🔁 Retrying upload due to server error...")
+            # Release this attempt's stream before the retry opens its own
+            if stream is not None:
+                stream.close()
             time.sleep(5)
-            return upload_video(file_path, title, description, tags, privacy)
+            return upload_video(file_path, title, description, tags, privacy, chunksize)
         else:
             raise
 
     except Exception as e:
         print(f"⚠️ Upload failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+    finally:
+        if stream is not None:
+            stream.close()
\ No newline at end of file